@@ -61,6 +61,19 @@ def main():
         errors.append(str(e))
         return 1
 
+    # 4. Training labels (vectorized / numba) agree with the scalar rule
+    try:
+        import numpy as np
+        from train_model import generate_synthetic_data
+        from _train_core import rule_based_score_rows
+        X, y = generate_synthetic_data(n_samples=2000)
+        assert np.array_equal(y, rule_based_score_rows(X)), "compute_labels disagrees with rule_based_score"
+        print("  [OK] training labels match rule_based_score")
+    except Exception as e:
+        print("  [FAIL] training labels:", e)
+        errors.append(str(e))
+        return 1
+
     print("\nML pipeline is working.")
     return 0
 
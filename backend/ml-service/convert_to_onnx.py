@@ -0,0 +1,28 @@
+"""
+Convert the trained eligibility model to ONNX for faster single-row inference.
+Run after train_model.py / train_from_csv.py: python convert_to_onnx.py
+Requires: pip install skl2onnx onnxruntime
+eligibility_service prefers artifacts/eligibility_model.onnx when onnxruntime is installed
+and the file is newer than eligibility_bundle.joblib.
+"""
+import os
+import joblib
+from skl2onnx import convert_sklearn
+from skl2onnx.common.data_types import FloatTensorType
+
+
+def main():
+    out_dir = os.path.join(os.path.dirname(__file__), "artifacts")
+    bundle = joblib.load(os.path.join(out_dir, "eligibility_bundle.joblib"))
+    onnx_model = convert_sklearn(
+        bundle["model"],
+        initial_types=[("input", FloatTensorType([None, len(bundle["feature_names"])]))],
+    )
+    onnx_path = os.path.join(out_dir, "eligibility_model.onnx")
+    with open(onnx_path, "wb") as f:
+        f.write(onnx_model.SerializeToString())
+    print("ONNX model saved to", onnx_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,30 +2,87 @@
 Eligibility scoring and XAI reasons using trained RandomForest model.
 """
 import os
+from pathlib import Path
+
+# Opt-in Intel oneDAL acceleration (pip install scikit-learn-intelex). Must patch before
+# scikit-learn is imported; verify scores match the stock build before enabling in production.
+if os.environ.get("HEMOLINK_USE_SKLEARNEX") == "1":
+    try:
+        from sklearnex import patch_sklearn
+        patch_sklearn()
+    except ImportError:
+        pass
+
 import joblib
 import numpy as np
-from typing import List
+from typing import List, Tuple
+
+from gemini_client import generate_xai_reasons_with_gemini
 
-_artifacts_dir = os.path.join(os.path.dirname(__file__), "artifacts")
+_ARTIFACTS_DIR = Path(__file__).resolve().parent / "artifacts"
+_BUNDLE_PATH = _ARTIFACTS_DIR / "eligibility_bundle.joblib"
+_ONNX_PATH = _ARTIFACTS_DIR / "eligibility_model.onnx"
+# Score for donors flagged with serious_condition (not eligible: must stay <= 15)
+SERIOUS_CONDITION_SCORE = 10
+_SERIOUS_CONDITION_REASON = "Serious health condition (e.g. cancer) – not eligible for donation"
+_initialized = False
 _model = None
-_scaler = None
+# StandardScaler statistics from older bundles, applied as a plain affine transform;
+# None for bundles trained on unscaled features
+_scaler_mean = None
+_scaler_scale = None
 _feature_names = None
+_session = None  # onnxruntime.InferenceSession when an up-to-date ONNX export is available
 
 
 def _load_model():
-    global _model, _scaler, _feature_names
-    if _model is not None:
+    global _initialized, _model, _scaler_mean, _scaler_scale, _feature_names, _session
+    if _initialized:
         return
-    model_path = os.path.join(_artifacts_dir, "eligibility_model.joblib")
-    scaler_path = os.path.join(_artifacts_dir, "eligibility_scaler.joblib")
-    names_path = os.path.join(_artifacts_dir, "feature_names.joblib")
-    if not os.path.isfile(model_path):
+    # One file for model, optional scaler statistics and feature names. The bundle is
+    # zlib-compressed, which joblib cannot memory-map, so it is loaded into the heap
+    try:
+        bundle = joblib.load(_BUNDLE_PATH)
+    except FileNotFoundError:
         raise FileNotFoundError(
-            f"Model not found at {model_path}. Run: python train_model.py"
-        )
-    _model = joblib.load(model_path)
-    _scaler = joblib.load(scaler_path)
-    _feature_names = joblib.load(names_path)
+            f"Model not found at {_BUNDLE_PATH}. Run: python train_model.py"
+        ) from None
+    _model = bundle["model"]
+    if bundle.get("scaler_mean") is not None:
+        _scaler_mean = np.array(bundle["scaler_mean"], dtype=np.float64)
+        _scaler_scale = np.array(bundle["scaler_scale"], dtype=np.float64)
+    _feature_names = list(bundle["feature_names"])
+    # Optional ONNX export (python convert_to_onnx.py); skipped if stale or onnxruntime is missing
+    if _ONNX_PATH.is_file() and _ONNX_PATH.stat().st_mtime >= _BUNDLE_PATH.stat().st_mtime:
+        try:
+            import onnxruntime as ort
+            _session = ort.InferenceSession(str(_ONNX_PATH), providers=["CPUExecutionProvider"])
+        except ImportError:
+            _session = None
+    _initialized = True
+
+
+def _scale(x: np.ndarray) -> np.ndarray:
+    if _scaler_mean is None:
+        return x.astype(np.float32)
+    # Scale in float64 (as at training time), then hand float32 to the predictor: the
+    # forest's tree code and ONNX Runtime both take float32, so neither copies again.
+    # Callers pass a freshly built feature array, so it is scaled in place.
+    x -= _scaler_mean
+    x /= _scaler_scale
+    return x.astype(np.float32)
+
+
+def _predict(x_scaled: np.ndarray) -> np.ndarray:
+    if _session is not None:
+        return _session.run(None, {"input": x_scaled})[0].ravel()
+    return _model.predict(x_scaled)
+
+
+def warm_up():
+    """Load artifacts and run one prediction so the first request does not pay cold-start cost."""
+    _load_model()
+    _predict(_scale(_build_features(0, 0.0, False, [])))
 
 
 def _build_features(
@@ -55,24 +112,24 @@ def compute_score_and_reasons(
     Uses model for score and feature contributions for reasons.
     """
     _load_model()
+    # Serious conditions (cancer, etc.) override: not eligible regardless of model,
+    # so skip inference and the Gemini XAI call entirely
+    flags_list = list(health_flags) if isinstance(health_flags, (list, tuple)) else []
+    if "serious_condition" in flags_list:
+        return SERIOUS_CONDITION_SCORE, [_SERIOUS_CONDITION_REASON]
+
     x = _build_features(
         days_since_last_donation,
         distance_km,
         is_available_now,
         health_flags,
     )
-    x_scaled = _scaler.transform(x)
-    score = float(np.clip(np.round(_model.predict(x_scaled)[0]), 0, 100))
-
-    # Serious conditions (cancer, etc.) override: not eligible regardless of model
-    flags_list = list(health_flags) if isinstance(health_flags, (list, tuple)) else []
-    if "serious_condition" in flags_list:
-        score = min(score, 15)
+    x_scaled = _scale(x)
+    score = float(np.clip(np.round(_predict(x_scaled)[0]), 0, 100))
 
     # XAI: try Gemini for natural-language reasons when API key is set; else rule-based
     reasons = []
     try:
-        from gemini_client import generate_xai_reasons_with_gemini
         health_count = len(health_flags) if isinstance(health_flags, list) else int(health_flags or 0)
         gemini_reasons = generate_xai_reasons_with_gemini(
             score=int(score),
@@ -86,22 +143,68 @@ def compute_score_and_reasons(
     except Exception:
         pass
     if not reasons:
-        if "serious_condition" in flags_list:
-            reasons = ["Serious health condition (e.g. cancer) – not eligible for donation"]
-        else:
-            if days_since_last_donation >= 90:
-                reasons.append("Eligible by donation gap (90+ days)")
-            elif days_since_last_donation >= 60:
-                reasons.append("Donation gap moderate (60–90 days)")
-            else:
-                reasons.append("Recently donated – check eligibility")
-            if distance_km <= 5:
-                reasons.append("Proximity match – within 5 km")
-            elif distance_km <= 15:
-                reasons.append("Within 15 km")
-            if is_available_now:
-                reasons.append("Marked available now")
-            if score >= 80:
-                reasons.append("High suitability score")
+        reasons = _rule_based_reasons(days_since_last_donation, distance_km, is_available_now, score)
 
     return int(score), reasons
+
+
+def compute_scores_batch(donors: List[dict]) -> List[Tuple[int, List[str]]]:
+    """
+    Batch compute_score_and_reasons: one predict over an (N, 4) feature matrix instead of N
+    single-row calls. Each donor dict holds compute_score_and_reasons' keyword arguments.
+    Reasons are rule-based (no per-donor Gemini call). Returns (score, reasons) per donor, in order.
+    """
+    _load_model()
+    results: List[Tuple[int, List[str]]] = [None] * len(donors)
+    rows = []
+    for i, donor in enumerate(donors):
+        flags = donor.get("health_flags")
+        if isinstance(flags, (list, tuple)) and "serious_condition" in flags:
+            results[i] = (SERIOUS_CONDITION_SCORE, [_SERIOUS_CONDITION_REASON])
+        else:
+            rows.append(i)
+    if rows:
+        x = np.vstack([
+            _build_features(
+                donors[i]["days_since_last_donation"],
+                donors[i]["distance_km"],
+                donors[i]["is_available_now"],
+                donors[i].get("health_flags") or [],
+            )
+            for i in rows
+        ])
+        scores = np.clip(np.round(_predict(_scale(x))), 0, 100)
+        for i, score in zip(rows, scores.tolist()):
+            donor = donors[i]
+            reasons = _rule_based_reasons(
+                donor["days_since_last_donation"],
+                donor["distance_km"],
+                donor["is_available_now"],
+                score,
+            )
+            results[i] = (int(score), reasons)
+    return results
+
+
+def _rule_based_reasons(
+    days_since_last_donation: int,
+    distance_km: float,
+    is_available_now: bool,
+    score: float,
+) -> List[str]:
+    reasons = []
+    if days_since_last_donation >= 90:
+        reasons.append("Eligible by donation gap (90+ days)")
+    elif days_since_last_donation >= 60:
+        reasons.append("Donation gap moderate (60–90 days)")
+    else:
+        reasons.append("Recently donated – check eligibility")
+    if distance_km <= 5:
+        reasons.append("Proximity match – within 5 km")
+    elif distance_km <= 15:
+        reasons.append("Within 15 km")
+    if is_available_now:
+        reasons.append("Marked available now")
+    if score >= 80:
+        reasons.append("High suitability score")
+    return reasons
@@ -2,20 +2,100 @@
 Gemini API client for health NLP and XAI reasons. Uses GEMINI_API_KEY from env.
 Falls back to None (caller uses rule-based logic) if key is missing or request fails.
 """
+import math
 import os
-import json
 import re
+import threading
 from typing import List, Optional
 
+import orjson
+from cachetools import TTLCache
+
+try:
+    import google.generativeai as genai
+except ImportError:
+    genai = None
+
 _gemini_configured = False
 _gemini_disabled = False
+_model_flash = None  # shared GenerativeModel, created once by _ensure_gemini
+
+# Generation configs: free-text scoring/reasons vs. short JSON classification
+_SCORE_CONFIG = {"temperature": 0.2, "max_output_tokens": 512}
+_CLASSIFY_CONFIG = {"temperature": 0.1, "max_output_tokens": 256}
+
+# Successful Gemini results are memoized for 10 minutes, keyed on normalized inputs.
+# Failures (None) are never cached so a transient API error is retried on the next call.
+_CACHE_TTL_SECONDS = 600
+_cache_lock = threading.Lock()
+_score_cache = TTLCache(maxsize=1024, ttl=_CACHE_TTL_SECONDS)
+_eligible_cache = TTLCache(maxsize=1024, ttl=_CACHE_TTL_SECONDS)
+_flags_cache = TTLCache(maxsize=1024, ttl=_CACHE_TTL_SECONDS)
+_xai_cache = TTLCache(maxsize=1024, ttl=_CACHE_TTL_SECONDS)
+
+_JSON_OBJECT_RE = re.compile(r"\{.*\}", re.DOTALL)
+
+# Max donor contexts packed into one prompt by eligibility_scores_batch
+_BATCH_SIZE = 20
+
+
+def _summary_key(text: str) -> str:
+    return " ".join((text or "").split()).lower()
+
+
+def _cache_get(cache: TTLCache, key):
+    with _cache_lock:
+        return cache.get(key)
+
+
+def _cache_set(cache: TTLCache, key, value):
+    if value is not None:
+        with _cache_lock:
+            cache[key] = value
+    return value
+
+
+def _score_key(health_summary: str, days_since_last_donation: int, distance_km: float, is_available_now: bool) -> tuple:
+    return (
+        _summary_key(health_summary),
+        int(days_since_last_donation),
+        round(float(distance_km), 1),
+        bool(is_available_now),
+    )
+
+
+def _score_from_data(data: Optional[dict]) -> Optional[tuple[int, List[str]]]:
+    """Parse {"score": ..., "reasons": [...]} from a Gemini response into (score, reasons)."""
+    if not data:
+        return None
+    score = data.get("score")
+    if score is None:
+        return None
+    score = float(score)
+    if not math.isfinite(score):
+        return None  # "inf" / "nan" parse as floats but are not scores
+    score = max(0, min(100, int(round(score))))
+    reasons = data.get("reasons") or []
+    reasons = [str(r).strip() for r in reasons if r][:6]
+    if not reasons:
+        reasons = [f"Eligibility score: {score}/100 (from full context)."]
+    return (score, reasons)
 
 
 def _extract_json(text: str) -> Optional[dict]:
     """Extract first JSON object from text (handles markdown code blocks and trailing text)."""
-    start = text.find("{")
-    if start == -1:
+    match = _JSON_OBJECT_RE.search(text)
+    if match is None:
         return None
+    # Fast path: first "{" to last "}" is usually exactly one object
+    try:
+        data = orjson.loads(match.group(0))
+        if isinstance(data, dict):
+            return data
+    except orjson.JSONDecodeError:
+        pass
+    # Slow path: trailing text contains braces, so find where the first object closes
+    start = match.start()
     depth = 0
     for i, c in enumerate(text[start:], start=start):
         if c == "{":
@@ -24,24 +104,24 @@ def _extract_json(text: str) -> Optional[dict]:
             depth -= 1
             if depth == 0:
                 try:
-                    return json.loads(text[start : i + 1])
-                except json.JSONDecodeError:
+                    return orjson.loads(text[start : i + 1])
+                except orjson.JSONDecodeError:
                     return None
     return None
 
 
 def _ensure_gemini():
-    global _gemini_configured, _gemini_disabled
+    global _gemini_configured, _gemini_disabled, _model_flash
     if _gemini_configured:
         return _gemini_disabled is False
     api_key = (os.environ.get("GEMINI_API_KEY") or "").strip()
-    if not api_key:
+    if not api_key or genai is None:
         _gemini_configured = True
         _gemini_disabled = True
         return False
     try:
-        import google.generativeai as genai
         genai.configure(api_key=api_key)
+        _model_flash = genai.GenerativeModel("gemini-1.5-flash")
         _gemini_configured = True
         _gemini_disabled = False
         return True
@@ -55,6 +135,58 @@ def is_gemini_available() -> bool:
     return _ensure_gemini()
 
 
+def _score_prompt(
+    health_summary: str,
+    days_since_last_donation: int,
+    distance_km: float,
+    is_available_now: bool,
+) -> str:
+    summary = (health_summary or "").strip() or "No health issues reported."
+    return f"""You are a blood donation eligibility advisor. Given the FULL context below, output a single eligibility score from 0 to 100 and 2 to 5 short reasons.
+
+Context:
+- Health summary: {summary}
+- Days since last donation: {days_since_last_donation}
+- Distance to request (km): {distance_km:.1f}
+- Available to donate now: {is_available_now}
+
+Use WHO and standard blood bank rules: HIV, AIDS, hepatitis, cancer, recent illness, chemotherapy, etc. make someone ineligible (score 0-20). Long gap since donation (e.g. 90+ days), being available, and short distance increase eligibility. Return ONLY a JSON object, no other text:
+{{"score": <0-100>, "reasons": ["reason1", "reason2", ...]}}
+"""
+
+
+def _cache_score(key: tuple, response) -> Optional[tuple[int, List[str]]]:
+    text = (response.text or "").strip()
+    result = _score_from_data(_extract_json(text))
+    if result is None:
+        return None
+    score, reasons = result
+    _cache_set(_score_cache, key, (score, tuple(reasons)))
+    return (score, reasons)
+
+
+_ELIGIBLE_PROMPT = """You are a medical advisor for blood donation eligibility. Based on WHO and standard blood bank guidelines, is this person ELIGIBLE to donate blood?
+
+Consider as NOT eligible: HIV, AIDS, hepatitis B or C, cancer, recent chemotherapy, chronic conditions that bar donation, recent major surgery, etc. If the summary mentions any condition that typically disqualifies blood donors, set eligible to false and give a short reason.
+
+Respond with ONLY a JSON object, no other text. Use exactly: {"eligible": false, "reason": "your reason"} or {"eligible": true}
+
+Health summary:
+"""
+
+
+def _cache_eligible(key: str, response) -> Optional[tuple[bool, Optional[str]]]:
+    text = (response.text or "").strip()
+    data = _extract_json(text)
+    if not data:
+        return None
+    eligible = data.get("eligible", True)
+    if eligible:
+        return _cache_set(_eligible_cache, key, (True, None))
+    reason = (data.get("reason") or "Health summary indicates conditions that typically disqualify blood donation.").strip()
+    return _cache_set(_eligible_cache, key, (False, reason or None))
+
+
 def eligibility_score_from_full_context(
     health_summary: str,
     days_since_last_donation: int,
@@ -66,47 +198,126 @@ def eligibility_score_from_full_context(
     No separate model or rules – one LLM call with full context (health, donation gap, distance, availability).
     Returns (score, reasons) or None on failure.
     """
+    key = _score_key(health_summary, days_since_last_donation, distance_km, is_available_now)
+    cached = _cache_get(_score_cache, key)
+    if cached is not None:
+        return (cached[0], list(cached[1]))
     if not _ensure_gemini():
         return None
     try:
-        import google.generativeai as genai
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        summary = (health_summary or "").strip() or "No health issues reported."
-        prompt = f"""You are a blood donation eligibility advisor. Given the FULL context below, output a single eligibility score from 0 to 100 and 2 to 5 short reasons.
+        response = _model_flash.generate_content(
+            _score_prompt(health_summary, days_since_last_donation, distance_km, is_available_now),
+            generation_config=_SCORE_CONFIG,
+        )
+        return _cache_score(key, response)
+    except Exception:
+        return None
 
-Context:
-- Health summary: {summary}
-- Days since last donation: {days_since_last_donation}
-- Distance to request (km): {distance_km:.1f}
-- Available to donate now: {is_available_now}
 
-Use WHO and standard blood bank rules: HIV, AIDS, hepatitis, cancer, recent illness, chemotherapy, etc. make someone ineligible (score 0-20). Long gap since donation (e.g. 90+ days), being available, and short distance increase eligibility. Return ONLY a JSON object, no other text:
-{{"score": <0-100>, "reasons": ["reason1", "reason2", ...]}}
-"""
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.2,
-                max_output_tokens=512,
-            ),
+async def eligibility_score_from_full_context_async(
+    health_summary: str,
+    days_since_last_donation: int,
+    distance_km: float,
+    is_available_now: bool,
+) -> Optional[tuple[int, List[str]]]:
+    """Async eligibility_score_from_full_context: awaits Gemini instead of blocking a worker thread."""
+    key = _score_key(health_summary, days_since_last_donation, distance_km, is_available_now)
+    cached = _cache_get(_score_cache, key)
+    if cached is not None:
+        return (cached[0], list(cached[1]))
+    if not _ensure_gemini():
+        return None
+    try:
+        response = await _model_flash.generate_content_async(
+            _score_prompt(health_summary, days_since_last_donation, distance_km, is_available_now),
+            generation_config=_SCORE_CONFIG,
         )
-        text = (response.text or "").strip()
-        data = _extract_json(text)
-        if not data:
-            return None
-        score = data.get("score")
-        if score is None:
-            return None
-        score = max(0, min(100, int(round(float(score)))))
-        reasons = data.get("reasons") or []
-        reasons = [str(r).strip() for r in reasons if r][:6]
-        if not reasons:
-            reasons = [f"Eligibility score: {score}/100 (from full context)."]
-        return (score, reasons)
+        return _cache_score(key, response)
     except Exception:
         return None
 
 
+def eligibility_scores_batch(items: List[dict]) -> List[Optional[tuple[int, List[str]]]]:
+    """
+    Score many donor contexts with as few Gemini round-trips as possible.
+    Each item has keys health_summary, days_since_last_donation, distance_km, is_available_now.
+    Uncached items are packed _BATCH_SIZE at a time into a single prompt; any item the batched
+    response does not cover is retried with eligibility_score_from_full_context.
+    Returns one (score, reasons) or None per item, in input order.
+    """
+    results: List[Optional[tuple[int, List[str]]]] = [None] * len(items)
+    keys = [
+        _score_key(
+            item.get("health_summary") or "",
+            item["days_since_last_donation"],
+            item["distance_km"],
+            item["is_available_now"],
+        )
+        for item in items
+    ]
+    pending = []
+    for i, key in enumerate(keys):
+        cached = _cache_get(_score_cache, key)
+        if cached is not None:
+            results[i] = (cached[0], list(cached[1]))
+        else:
+            pending.append(i)
+    if not pending or not _ensure_gemini():
+        return results
+
+    for start in range(0, len(pending), _BATCH_SIZE):
+        chunk = pending[start : start + _BATCH_SIZE]
+        try:
+            donors = "\n".join(
+                f"{n}. Health summary: {(items[i].get('health_summary') or '').strip() or 'No health issues reported.'} | "
+                f"Days since last donation: {items[i]['days_since_last_donation']} | "
+                f"Distance to request (km): {float(items[i]['distance_km']):.1f} | "
+                f"Available to donate now: {items[i]['is_available_now']}"
+                for n, i in enumerate(chunk, start=1)
+            )
+            prompt = f"""You are a blood donation eligibility advisor. For EACH numbered donor below, output an eligibility score from 0 to 100 and 2 to 5 short reasons, judging every donor independently on its full context.
+
+Donors:
+{donors}
+
+Use WHO and standard blood bank rules: HIV, AIDS, hepatitis, cancer, recent illness, chemotherapy, etc. make someone ineligible (score 0-20). Long gap since donation (e.g. 90+ days), being available, and short distance increase eligibility. Return ONLY a JSON object, no other text:
+{{"results": [{{"id": 1, "score": <0-100>, "reasons": ["reason1", "reason2", ...]}}, ...]}}
+"""
+            response = _model_flash.generate_content(
+                prompt,
+                generation_config={**_SCORE_CONFIG, "max_output_tokens": min(8192, 384 * len(chunk))},
+            )
+            data = _extract_json((response.text or "").strip()) or {}
+            for entry in data.get("results") or []:
+                # One malformed entry must not drop the rest of the chunk to per-item calls
+                if not isinstance(entry, dict):
+                    continue
+                try:
+                    n = int(entry.get("id", 0))
+                    if not 1 <= n <= len(chunk):
+                        continue
+                    result = _score_from_data(entry)
+                except (TypeError, ValueError, OverflowError):
+                    continue
+                if result is not None:
+                    i = chunk[n - 1]
+                    results[i] = result
+                    _cache_set(_score_cache, keys[i], (result[0], tuple(result[1])))
+        except Exception:
+            pass
+
+    for i in pending:
+        if results[i] is None:
+            item = items[i]
+            results[i] = eligibility_score_from_full_context(
+                health_summary=item.get("health_summary") or "",
+                days_since_last_donation=item["days_since_last_donation"],
+                distance_km=item["distance_km"],
+                is_available_now=item["is_available_now"],
+            )
+    return results
+
+
 def check_blood_donation_eligible(health_summary: str) -> Optional[tuple[bool, Optional[str]]]:
     """
     Use Gemini to decide if the person is eligible to donate blood based on health summary.
@@ -115,35 +326,38 @@ def check_blood_donation_eligible(health_summary: str) -> Optional[tuple[bool, O
     """
     if not health_summary or not health_summary.strip():
         return (True, None)
+    key = _summary_key(health_summary)
+    cached = _cache_get(_eligible_cache, key)
+    if cached is not None:
+        return cached
     if not _ensure_gemini():
         return None
     try:
-        import google.generativeai as genai
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        prompt = """You are a medical advisor for blood donation eligibility. Based on WHO and standard blood bank guidelines, is this person ELIGIBLE to donate blood?
-
-Consider as NOT eligible: HIV, AIDS, hepatitis B or C, cancer, recent chemotherapy, chronic conditions that bar donation, recent major surgery, etc. If the summary mentions any condition that typically disqualifies blood donors, set eligible to false and give a short reason.
+        response = _model_flash.generate_content(
+            _ELIGIBLE_PROMPT + health_summary.strip(),
+            generation_config=_CLASSIFY_CONFIG,
+        )
+        return _cache_eligible(key, response)
+    except Exception:
+        return None
 
-Respond with ONLY a JSON object, no other text. Use exactly: {"eligible": false, "reason": "your reason"} or {"eligible": true}
 
-Health summary:
-"""
-        response = model.generate_content(
-            prompt + health_summary.strip(),
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.1,
-                max_output_tokens=256,
-            ),
+async def check_blood_donation_eligible_async(health_summary: str) -> Optional[tuple[bool, Optional[str]]]:
+    """Async check_blood_donation_eligible: awaits Gemini instead of blocking a worker thread."""
+    if not health_summary or not health_summary.strip():
+        return (True, None)
+    key = _summary_key(health_summary)
+    cached = _cache_get(_eligible_cache, key)
+    if cached is not None:
+        return cached
+    if not _ensure_gemini():
+        return None
+    try:
+        response = await _model_flash.generate_content_async(
+            _ELIGIBLE_PROMPT + health_summary.strip(),
+            generation_config=_CLASSIFY_CONFIG,
         )
-        text = (response.text or "").strip()
-        data = _extract_json(text)
-        if not data:
-            return None
-        eligible = data.get("eligible", True)
-        if eligible:
-            return (True, None)
-        reason = (data.get("reason") or "Health summary indicates conditions that typically disqualify blood donation.").strip()
-        return (False, reason or None)
+        return _cache_eligible(key, response)
     except Exception:
         return None
 
@@ -155,11 +369,13 @@ def generate_health_flags_with_gemini(health_summary: str) -> Optional[List[str]
     """
     if not health_summary or not health_summary.strip():
         return []
+    key = _summary_key(health_summary)
+    cached = _cache_get(_flags_cache, key)
+    if cached is not None:
+        return list(cached)
     if not _ensure_gemini():
         return None
     try:
-        import google.generativeai as genai
-        model = genai.GenerativeModel("gemini-1.5-flash")
         prompt = """You are a medical text analyzer for blood donor eligibility. From the donor's health summary below, extract ONLY the following flags if clearly mentioned (use exactly these names, nothing else):
 - recent_illness (recent fever, cold, flu, infection, cough, unwell)
 - diabetes (diabetes, blood sugar, glucose issues)
@@ -173,19 +389,18 @@ If a flag is not mentioned or unclear, do not include it. For "I have cancer" or
 
 Health summary:
 """
-        response = model.generate_content(
+        response = _model_flash.generate_content(
             prompt + health_summary.strip(),
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.1,
-                max_output_tokens=256,
-            ),
+            generation_config=_CLASSIFY_CONFIG,
         )
         text = (response.text or "").strip()
         data = _extract_json(text)
         if data:
             flags = data.get("flags") or []
             allowed = {"recent_illness", "diabetes", "anemia", "bp", "medication", "serious_condition"}
-            return [f for f in flags if f in allowed]
+            result = [f for f in flags if f in allowed]
+            _cache_set(_flags_cache, key, tuple(result))
+            return result
         return None
     except Exception:
         return None
@@ -202,11 +417,19 @@ def generate_xai_reasons_with_gemini(
     Use Gemini to generate 3–5 short, clear XAI reasons for the eligibility score.
     Returns list of reason strings or None on failure.
     """
+    key = (
+        int(score),
+        int(days_since_last_donation),
+        round(float(distance_km), 1),
+        bool(is_available_now),
+        int(health_flag_count),
+    )
+    cached = _cache_get(_xai_cache, key)
+    if cached is not None:
+        return list(cached)
     if not _ensure_gemini():
         return None
     try:
-        import google.generativeai as genai
-        model = genai.GenerativeModel("gemini-1.5-flash")
         prompt = f"""You are explaining why a blood donor has an eligibility score of {score}/100 to a requester. Based only on these facts, give 3 to 5 short, clear reasons (one line each). Be factual and neutral.
 
 Facts:
@@ -218,18 +441,17 @@ Facts:
 Respond with ONLY a JSON object of this form, no other text:
 {{"reasons": ["Reason one.", "Reason two.", "Reason three."]}}
 """
-        response = model.generate_content(
+        response = _model_flash.generate_content(
             prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.2,
-                max_output_tokens=512,
-            ),
+            generation_config=_SCORE_CONFIG,
         )
         text = (response.text or "").strip()
         data = _extract_json(text)
         if data:
             reasons = data.get("reasons") or []
-            return [str(r).strip() for r in reasons if r][:6]
+            result = [str(r).strip() for r in reasons if r][:6]
+            _cache_set(_xai_cache, key, tuple(result))
+            return result
         return None
     except Exception:
         return None
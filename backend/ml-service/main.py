@@ -2,19 +2,36 @@
 FastAPI service: ML eligibility scoring and NLP health normalization.
 Run: uvicorn main:app --reload --host 0.0.0.0 --port 8000
 """
+import asyncio
+from contextlib import asynccontextmanager
 from pathlib import Path
 from dotenv import load_dotenv
 load_dotenv(Path(__file__).resolve().parent / ".env")
 
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 
-from eligibility_service import compute_score_and_reasons
+from eligibility_service import compute_score_and_reasons, compute_scores_batch, warm_up
 from nlp_health import normalize_health_to_flags
-from gemini_client import check_blood_donation_eligible, eligibility_score_from_full_context
+from gemini_client import (
+    check_blood_donation_eligible_async,
+    eligibility_score_from_full_context_async,
+    eligibility_scores_batch,
+)
 
-app = FastAPI(title="HemoLink ML Service", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load and exercise the model at startup rather than on the first request
+    try:
+        await asyncio.to_thread(warm_up)
+    except FileNotFoundError:
+        pass  # /predict-eligibility reports missing artifacts as 503
+    yield
+
+
+app = FastAPI(title="HemoLink ML Service", version="1.0.0", lifespan=lifespan)
 
 
 class PredictEligibilityBody(BaseModel):
@@ -25,17 +42,25 @@ class PredictEligibilityBody(BaseModel):
     healthSummary: Optional[str] = None  # when set + Gemini available, score comes from Gemini with full context
 
 
+# Bounds one batch request to ten batched Gemini prompts (plus their single-item fallbacks)
+MAX_BATCH_ITEMS = 200
+
+
+class PredictEligibilityBatchBody(BaseModel):
+    items: List[PredictEligibilityBody] = Field(..., max_length=MAX_BATCH_ITEMS)
+
+
 class NormalizeHealthBody(BaseModel):
     text: str
 
 
 @app.post("/predict-eligibility")
-def predict_eligibility(body: PredictEligibilityBody):
+async def predict_eligibility(body: PredictEligibilityBody):
     """Eligibility score (0-100) and reasons: from Gemini with full context when healthSummary + API key set, else RandomForest."""
     try:
         health_summary = (body.healthSummary or "").strip()
         if health_summary:
-            result = eligibility_score_from_full_context(
+            result = await eligibility_score_from_full_context_async(
                 health_summary=health_summary,
                 days_since_last_donation=body.daysSinceLastDonation,
                 distance_km=body.distanceKm,
@@ -44,7 +69,9 @@ def predict_eligibility(body: PredictEligibilityBody):
             if result is not None:
                 score, reasons = result
                 return {"score": score, "reasons": reasons}
-        score, reasons = compute_score_and_reasons(
+        # RandomForest predict and the sync Gemini XAI call run off the event loop
+        score, reasons = await asyncio.to_thread(
+            compute_score_and_reasons,
             days_since_last_donation=body.daysSinceLastDonation,
             distance_km=body.distanceKm,
             is_available_now=body.isAvailableNow,
@@ -57,11 +84,49 @@ def predict_eligibility(body: PredictEligibilityBody):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/predict-eligibility-batch")
+def predict_eligibility_batch(body: PredictEligibilityBatchBody):
+    """Bulk /predict-eligibility: items with healthSummary share batched Gemini calls, the rest use RandomForest."""
+    try:
+        results = [None] * len(body.items)
+        with_summary = [i for i, item in enumerate(body.items) if (item.healthSummary or "").strip()]
+        if with_summary:
+            gemini_results = eligibility_scores_batch([
+                {
+                    "health_summary": body.items[i].healthSummary.strip(),
+                    "days_since_last_donation": body.items[i].daysSinceLastDonation,
+                    "distance_km": body.items[i].distanceKm,
+                    "is_available_now": body.items[i].isAvailableNow,
+                }
+                for i in with_summary
+            ])
+            for i, result in zip(with_summary, gemini_results):
+                results[i] = result
+        # Everything Gemini did not score goes through one RandomForest predict
+        remaining = [i for i, result in enumerate(results) if result is None]
+        model_results = compute_scores_batch([
+            {
+                "days_since_last_donation": body.items[i].daysSinceLastDonation,
+                "distance_km": body.items[i].distanceKm,
+                "is_available_now": body.items[i].isAvailableNow,
+                "health_flags": body.items[i].healthFlags,
+            }
+            for i in remaining
+        ])
+        for i, result in zip(remaining, model_results):
+            results[i] = result
+        return {"results": [{"score": score, "reasons": reasons} for score, reasons in results]}
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/check-eligibility-from-health")
-def check_eligibility_from_health(body: NormalizeHealthBody):
+async def check_eligibility_from_health(body: NormalizeHealthBody):
     """Use Gemini to decide if health summary indicates ineligibility (no hardcoded diseases)."""
     try:
-        result = check_blood_donation_eligible(body.text or "")
+        result = await check_blood_donation_eligible_async(body.text or "")
         if result is None:
             return {"eligible": True}
         eligible, reason = result
@@ -71,10 +136,10 @@ def check_eligibility_from_health(body: NormalizeHealthBody):
 
 
 @app.post("/normalize-health")
-def normalize_health(body: NormalizeHealthBody):
-    """Extract eligibility-related health flags from free text using NLTK tokenization and lemmatization."""
+async def normalize_health(body: NormalizeHealthBody):
+    """Extract eligibility-related health flags from free text (Gemini when available, else keyword matching)."""
     try:
-        flags = normalize_health_to_flags(body.text or "")
+        flags = await asyncio.to_thread(normalize_health_to_flags, body.text or "")
         return {"flags": flags}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
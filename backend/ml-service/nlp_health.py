@@ -1,13 +1,20 @@
 """
-NLP health normalizer: tokenize, lemmatize, and map free text to eligibility flags
-using NLTK and an expanded medical term list.
+NLP health normalizer: map free text to eligibility flags with an expanded medical
+term list (Aho-Corasick substring matching), optionally adding NLTK lemmas.
 """
 import re
 import string
-from typing import List
+from functools import lru_cache
+from typing import List, Tuple
 
-# Lazy init NLTK resources
+import ahocorasick
+
+from gemini_client import generate_health_flags_with_gemini
+
+# Lazy check of NLTK resources (only needed for use_lemmas=True). They are installed at
+# setup time, never downloaded mid-request.
 _nltk_ready = False
+_NLTK_RESOURCES = {"punkt_tab": "tokenizers/punkt_tab", "wordnet": "corpora/wordnet"}
 
 
 def _ensure_nltk():
@@ -15,18 +22,17 @@ def _ensure_nltk():
     if _nltk_ready:
         return
     import nltk
-    try:
-        nltk.data.find("tokenizers/punkt_tab")
-    except LookupError:
-        nltk.download("punkt_tab", quiet=True)
-    try:
-        nltk.data.find("corpora/wordnet")
-    except LookupError:
-        nltk.download("wordnet", quiet=True)
-    try:
-        nltk.data.find("taggers/averaged_perceptron_tagger_eng")
-    except LookupError:
-        nltk.download("averaged_perceptron_tagger_eng", quiet=True)
+    missing = []
+    for name, path in _NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(path)
+        except LookupError:
+            missing.append(name)
+    if missing:
+        raise LookupError(
+            f"NLTK data not installed: {', '.join(missing)}. "
+            f"Run: python -m nltk.downloader {' '.join(missing)} (or set NLTK_DATA to its location)"
+        )
     _nltk_ready = True
 
 
@@ -61,77 +67,96 @@ HEALTH_TERMS = {
 }
 
 
+# Output order of flags (HEALTH_TERMS insertion order)
+FLAG_ORDER = tuple(HEALTH_TERMS)
+
+
 def _normalize_word(s: str) -> str:
     return re.sub(r"\s+", " ", s).strip().lower()
 
 
+# Every HEALTH_TERMS entry as (flag, normalized term), built once at import
+_NORMALIZED_TERMS: List[Tuple[str, str]] = list(dict.fromkeys(
+    (flag, _normalize_word(term))
+    for flag, terms in HEALTH_TERMS.items()
+    for term in terms
+))
+
+
+def _build_term_automaton() -> "ahocorasick.Automaton":
+    """One Aho-Corasick automaton over _NORMALIZED_TERMS; each term's value is the tuple of its flags."""
+    automaton = ahocorasick.Automaton()
+    for flag, term in _NORMALIZED_TERMS:
+        automaton.add_word(term, automaton.get(term, ()) + (flag,))
+    automaton.make_automaton()
+    return automaton
+
+
+_TERM_AUTOMATON = _build_term_automaton()
+
+
+_PUNCT_TABLE = str.maketrans(string.punctuation, " " * len(string.punctuation))
+
+
 def _tokenize_and_lemmatize(text: str) -> List[str]:
     _ensure_nltk()
     from nltk.tokenize import word_tokenize
     from nltk.stem import WordNetLemmatizer
     from nltk.corpus import wordnet
-    from nltk import pos_tag
 
     text = _normalize_word(text)
     if not text:
         return []
     # Remove punctuation for tokenization
-    for c in string.punctuation:
-        text = text.replace(c, " ")
+    text = text.translate(_PUNCT_TABLE)
     tokens = word_tokenize(text)
     lemmatizer = WordNetLemmatizer()
 
-    def pos_to_wn(tag: str):
-        if tag.startswith("J"):
-            return wordnet.ADJ
-        if tag.startswith("V"):
-            return wordnet.VERB
-        if tag.startswith("N"):
-            return wordnet.NOUN
-        if tag.startswith("R"):
-            return wordnet.ADV
-        return wordnet.NOUN
-
-    tagged = pos_tag(tokens)
+    # Noun and verb lemmas cover the term list without a per-request POS tagging pass
     lemmas = []
-    for word, tag in tagged:
+    for word in tokens:
         w = word.lower()
         if not w.isalnum() or len(w) < 2:
             continue
-        lem = lemmatizer.lemmatize(w, pos=pos_to_wn(tag))
-        lemmas.append(lem)
-        if lem != w:
-            lemmas.append(w)
+        lemmas.append(w)
+        lemmas.append(lemmatizer.lemmatize(w, pos=wordnet.NOUN))
+        lemmas.append(lemmatizer.lemmatize(w, pos=wordnet.VERB))
     return list(set(lemmas))
 
 
-def _normalize_health_to_flags_nltk(health_summary: str) -> List[str]:
-    """NLTK + keyword-based extraction (fallback when Gemini is not used)."""
+def _normalize_health_to_flags_nltk(health_summary: str, use_lemmas: bool = False) -> List[str]:
+    """
+    Keyword-based extraction (fallback when Gemini is not used).
+    use_lemmas additionally matches NLTK lemmas of each token; off by default since
+    substring matching already finds most inflections (e.g. "infections" contains "infection").
+    """
     text = _normalize_word(health_summary)
     if not text:
         return []
-    tokens_and_phrases = _tokenize_and_lemmatize(health_summary)
-    words = text.split()
-    for i in range(len(words)):
-        for n in (2, 3):
-            if i + n <= len(words):
-                phrase = " ".join(words[i : i + n])
-                tokens_and_phrases.append(phrase)
-    tokens_set = set(tokens_and_phrases)
-    flags = []
-    for flag, terms in HEALTH_TERMS.items():
-        for term in terms:
-            t_norm = _normalize_word(term)
-            if t_norm in tokens_set or t_norm in text:
-                flags.append(flag)
-                break
-    return list(dict.fromkeys(flags))
+    # Single linear scan for every term occurring as a substring of the normalized text
+    matched = dict.fromkeys(FLAG_ORDER, False)
+    for _, term_flags in _TERM_AUTOMATON.iter(text):
+        for flag in term_flags:
+            matched[flag] = True
+    if use_lemmas:
+        tokens_set = set(_tokenize_and_lemmatize(health_summary))
+        for flag, term in _NORMALIZED_TERMS:
+            if term in tokens_set:
+                matched[flag] = True
+    return [flag for flag in FLAG_ORDER if matched[flag]]
+
+
+@lru_cache(maxsize=4096)
+def _keyword_flags_cached(health_summary: str) -> Tuple[str, ...]:
+    """Memoized keyword path; a tuple so callers cannot mutate the cached value."""
+    return tuple(_normalize_health_to_flags_nltk(health_summary))
 
 
 def normalize_health_to_flags(health_summary: str) -> List[str]:
     """
     Map free-text health summary to eligibility flags.
-    Uses Gemini when GEMINI_API_KEY is set; otherwise NLTK + keyword matching.
+    Uses Gemini when GEMINI_API_KEY is set; otherwise keyword matching.
+    Both paths are memoized: Gemini results in gemini_client's TTL cache, keyword results here.
     """
     if not health_summary or not isinstance(health_summary, str):
         return []
@@ -139,10 +164,9 @@ def normalize_health_to_flags(health_summary: str) -> List[str]:
     if not text:
         return []
     try:
-        from gemini_client import generate_health_flags_with_gemini
         gemini_flags = generate_health_flags_with_gemini(health_summary)
         if gemini_flags is not None:
             return gemini_flags
     except Exception:
         pass
-    return _normalize_health_to_flags_nltk(health_summary)
+    return list(_keyword_flags_cached(health_summary))
@@ -12,11 +12,18 @@ from fastapi.testclient import TestClient
 # Ensure app can load (dotenv, paths)
 sys.path.insert(0, os.path.dirname(__file__))
 
-from main import app
+from main import MAX_BATCH_ITEMS, app
 
 client = TestClient(app)
 
 
+@pytest.fixture
+def requires_artifacts():
+    """Skip tests that need the trained model bundle when it has not been built."""
+    if not os.path.isfile(os.path.join(os.path.dirname(__file__), "artifacts", "eligibility_bundle.joblib")):
+        pytest.skip("Run python train_model.py first to create artifacts")
+
+
 def test_health():
     """GET /health returns 200 and status ok."""
     r = client.get("/health")
@@ -24,6 +31,17 @@ def test_health():
     assert r.json() == {"status": "ok"}
 
 
+def test_startup_loads_model(requires_artifacts, monkeypatch):
+    """App startup loads the model so the first prediction is warm."""
+    import eligibility_service
+
+    # Start unloaded so an earlier test's request can't satisfy the assertion
+    monkeypatch.setattr(eligibility_service, "_initialized", False)
+    monkeypatch.setattr(eligibility_service, "_model", None)
+    with TestClient(app):
+        assert eligibility_service._model is not None
+
+
 class TestNormalizeHealth:
     """POST /normalize-health: NLP extraction with extreme/varied inputs."""
 
@@ -61,20 +79,20 @@ class TestNormalizeHealth:
         assert r.status_code == 200
         assert "serious_condition" in r.json()["flags"]
 
+    def test_unlisted_word_is_not_flagged(self):
+        r = client.post("/normalize-health", json={"text": "prescribed glasses"})
+        assert r.status_code == 200
+        assert "medication" not in r.json()["flags"]
+
     def test_missing_body_returns_422(self):
         r = client.post("/normalize-health", json={})
         assert r.status_code == 422
 
 
+@pytest.mark.usefixtures("requires_artifacts")
 class TestPredictEligibility:
     """POST /predict-eligibility: ML model with extreme outcomes."""
 
-    @pytest.fixture(autouse=True)
-    def check_artifacts(self):
-        p = os.path.join(os.path.dirname(__file__), "artifacts", "eligibility_model.joblib")
-        if not os.path.isfile(p):
-            pytest.skip("Run python train_model.py first to create artifacts")
-
     def test_ideal_donor_high_score(self):
         """90+ days, near, available, no health flags -> high score."""
         r = client.post(
@@ -149,3 +167,105 @@ class TestPredictEligibility:
     def test_invalid_body_returns_422(self):
         r = client.post("/predict-eligibility", json={"daysSinceLastDonation": 90})
         assert r.status_code == 422
+
+
+@pytest.mark.usefixtures("requires_artifacts")
+class TestPredictEligibilityBatch:
+    """POST /predict-eligibility-batch: one result per item, in order."""
+
+    def test_results_match_single_predictions(self):
+        items = [
+            {"daysSinceLastDonation": 120, "distanceKm": 2.0, "isAvailableNow": True, "healthFlags": []},
+            {"daysSinceLastDonation": 1, "distanceKm": 999.0, "isAvailableNow": False, "healthFlags": ["diabetes"]},
+        ]
+        r = client.post("/predict-eligibility-batch", json={"items": items})
+        assert r.status_code == 200
+        results = r.json()["results"]
+        assert len(results) == len(items)
+        for item, result in zip(items, results):
+            single = client.post("/predict-eligibility", json=item).json()
+            assert result["score"] == single["score"]
+            assert isinstance(result["reasons"], list)
+
+    def test_empty_items_returns_empty_results(self):
+        r = client.post("/predict-eligibility-batch", json={"items": []})
+        assert r.status_code == 200
+        assert r.json()["results"] == []
+
+    def test_invalid_item_returns_422(self):
+        r = client.post("/predict-eligibility-batch", json={"items": [{"daysSinceLastDonation": 90}]})
+        assert r.status_code == 422
+
+    def test_too_many_items_returns_422(self):
+        item = {"daysSinceLastDonation": 90, "distanceKm": 1.0, "isAvailableNow": True}
+        r = client.post("/predict-eligibility-batch", json={"items": [item] * (MAX_BATCH_ITEMS + 1)})
+        assert r.status_code == 422
+
+
+def test_batch_scores_skip_malformed_entries(monkeypatch):
+    """A bad entry in a batched Gemini response only sends its own item to a single call."""
+    import gemini_client
+
+    class Response:
+        text = (
+            '{"results": ["junk", {"id": "two", "score": 10}, {"id": 2, "score": "inf"},'
+            ' {"id": 4, "score": "abc"}, {"id": 1, "score": 80, "reasons": ["ok"]},'
+            ' {"id": 3, "score": 40, "reasons": ["fine"]}]}'
+        )
+
+    class Model:
+        def generate_content(self, prompt, generation_config=None):
+            return Response()
+
+    fallbacks = []
+    monkeypatch.setattr(gemini_client, "_model_flash", Model())
+    monkeypatch.setattr(gemini_client, "_ensure_gemini", lambda: True)
+    monkeypatch.setattr(gemini_client, "_score_cache", {})
+    monkeypatch.setattr(
+        gemini_client,
+        "eligibility_score_from_full_context",
+        lambda **item: fallbacks.append(item["health_summary"]) or (0, ["fallback"]),
+    )
+    items = [
+        {"health_summary": f"donor {n}", "days_since_last_donation": 100, "distance_km": 1.0, "is_available_now": True}
+        for n in range(1, 5)
+    ]
+    results = gemini_client.eligibility_scores_batch(items)
+    assert results == [(80, ["ok"]), (0, ["fallback"]), (40, ["fine"]), (0, ["fallback"])]
+    assert fallbacks == ["donor 2", "donor 4"]
+
+
+@pytest.mark.parametrize("use_arrow", [True, False])
+def test_load_csv_data_matches_dictreader_rows(tmp_path, monkeypatch, use_arrow):
+    """load_csv_data keeps and skips the same rows as a csv.DictReader + int() loop."""
+    import csv
+
+    import train_from_csv
+
+    if not use_arrow:
+        monkeypatch.setattr(train_from_csv, "pa", None)
+    path = tmp_path / "donors.csv"
+    path.write_text(
+        "months_since_first_donation,number_of_donation,availability\n"
+        "24,4, Yes\n"
+        ",3,yes\n"  # blank count
+        "abc,2,yes\n"  # junk count
+        "3.5,1,yes\n"  # fractional counts
+        "12,2.5,no\n"
+        "120,0,NO\n"
+        "6,3,\n",
+        encoding="utf-8",
+    )
+    expected = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            try:
+                months = int(row["months_since_first_donation"])
+                num_don = int(row["number_of_donation"])
+            except ValueError:
+                continue
+            days = min(max(0, int((months * 30) / max(1, num_don))), 400)
+            expected.append((days, row["availability"].strip().lower() == "yes"))
+    X, y = train_from_csv.load_csv_data(str(path))
+    assert X[:, [0, 2]].tolist() == [[float(d), float(a)] for d, a in expected]
+    assert len(y) == len(expected) == 3
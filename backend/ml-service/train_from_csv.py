@@ -4,41 +4,105 @@ plus the same 4-feature interface (distance_km and health_flag_count are synthet
 Saves same artifacts as train_model.py so the API stays unchanged.
 """
 import os
-import csv
+import warnings
+from functools import lru_cache
+from pathlib import Path
+
 import numpy as np
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.preprocessing import StandardScaler
+import pandas as pd
 from sklearn.model_selection import train_test_split
-import joblib
-
-# Same as train_model.py – API expects these 4 features
-FEATURE_NAMES = [
-    "days_since_last_donation",
-    "distance_km",
-    "is_available_now",
-    "health_flag_count",
-]
-
-
-def rule_based_score(days_since: int, distance_km: float, is_available: bool, health_flag_count: int) -> float:
-    """Target label (0-100) for training."""
-    min_days = 90
-    score = 50.0
-    if days_since >= min_days:
-        score += 25
-    elif days_since >= 60:
-        score += 10
-    if is_available:
-        score += 15
-    if distance_km <= 5:
-        score += 10
-    elif distance_km <= 15:
-        score += 5
-    if health_flag_count == 0:
-        score += 5
-    else:
-        score -= health_flag_count * 10
-    return float(np.clip(np.round(score), 0, 100))
+
+from _train_core import (
+    WARM_START_TREES, compute_labels, fit_model, load_warm_start_model, save_bundle, use_hgb,
+)
+
+try:
+    import pyarrow as pa  # optional: multithreaded CSV parsing (pip install pyarrow)
+    import pyarrow.compute as pc
+    import pyarrow.csv as pv
+except ImportError:
+    pa = None
+
+_BASE_DIR = Path(__file__).resolve().parent
+_CSV_NAME = "blood_donor_dataset.csv"
+_CSV_COLUMNS = ["months_since_first_donation", "number_of_donation", "availability"]
+_CSV_CHUNK_ROWS = 100_000
+
+
+@lru_cache(maxsize=1)
+def _find_csv():
+    """Path of blood_donor_dataset.csv in the project root (akil/) or next to this script, else None."""
+    for root in (_BASE_DIR.parents[1], _BASE_DIR):
+        candidate = root / _CSV_NAME
+        if candidate.is_file():
+            return candidate
+    return None
+
+
+def _count_lines(path: str) -> int:
+    """Newline count, an upper bound on the number of data rows (the header takes one line)."""
+    with open(path, "rb") as f:
+        return sum(block.count(b"\n") for block in iter(lambda: f.read(1 << 20), b""))
+
+
+def _days_since(months: np.ndarray, num_don: np.ndarray) -> np.ndarray:
+    # Approximate days since last donation (average gap between donations)
+    return np.clip((months.astype(np.int64) * 30) // np.maximum(num_don, 1), 0, 400)
+
+
+def _read_columns_arrow(csv_path: str, days: np.ndarray, available: np.ndarray) -> int:
+    """
+    Stream record batches from pyarrow's C++ parser into days/available; returns the row count.
+    Raises pa.ArrowInvalid if a count is not an integer.
+    """
+    reader = pv.open_csv(
+        str(csv_path),
+        convert_options=pv.ConvertOptions(
+            include_columns=_CSV_COLUMNS,
+            column_types={
+                "months_since_first_donation": pa.int32(),
+                "number_of_donation": pa.int32(),
+                "availability": pa.string(),
+            },
+        ),
+    )
+    n = 0
+    for batch in reader:
+        months = batch.column("months_since_first_donation")
+        num_don = batch.column("number_of_donation")
+        # Rows with missing counts are skipped
+        valid = pc.and_(pc.is_valid(months), pc.is_valid(num_don))
+        months = pc.filter(months, valid).to_numpy(zero_copy_only=True)
+        num_don = pc.filter(num_don, valid).to_numpy(zero_copy_only=True)
+        is_yes = pc.equal(pc.utf8_lower(pc.utf8_trim_whitespace(batch.column("availability"))), "yes")
+        k = len(months)
+        days[n:n + k] = _days_since(months, num_don)
+        available[n:n + k] = pc.filter(pc.fill_null(is_yes, False), valid).to_numpy(zero_copy_only=False)
+        n += k
+    return n
+
+
+def _read_columns_pandas(csv_path: str, days: np.ndarray, available: np.ndarray) -> int:
+    """Same as _read_columns_arrow via pandas chunks; rows with non-integer counts are skipped too."""
+    n = 0
+    for chunk in pd.read_csv(
+        csv_path,
+        usecols=_CSV_COLUMNS,
+        dtype={"availability": str},
+        chunksize=_CSV_CHUNK_ROWS,
+    ):
+        # Rows with missing, non-numeric or fractional counts are skipped (int() rejected them)
+        months = pd.to_numeric(chunk["months_since_first_donation"], errors="coerce")
+        num_don = pd.to_numeric(chunk["number_of_donation"], errors="coerce")
+        valid = (months.notna() & num_don.notna() & (months % 1 == 0) & (num_don % 1 == 0)).to_numpy()
+        months = months.to_numpy()[valid].astype(np.int64)
+        num_don = num_don.to_numpy()[valid].astype(np.int64)
+        availability = chunk["availability"].fillna("").str.strip().str.lower().to_numpy()[valid]
+        k = len(months)
+        days[n:n + k] = _days_since(months, num_don)
+        available[n:n + k] = availability == "yes"
+        n += k
+    return n
 
 
 def load_csv_data(csv_path: str, seed: int = 42) -> tuple:
@@ -48,53 +112,40 @@ def load_csv_data(csv_path: str, seed: int = 42) -> tuple:
     - is_available_now: from availability (Yes/No)
     - distance_km, health_flag_count: synthetic (sampled) so we keep 4-feature API
     """
-    np.random.seed(seed)
-    rows = []
-    with open(csv_path, newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            try:
-                months = int(row.get("months_since_first_donation", 0))
-                num_don = int(row.get("number_of_donation", 1))
-                # Approximate days since last donation (average gap between donations)
-                days_since = int((months * 30) / max(1, num_don))
-                days_since = min(max(0, days_since), 400)
-                is_available = 1 if (row.get("availability", "").strip().lower() == "yes") else 0
-                rows.append((days_since, is_available))
-            except (ValueError, KeyError):
-                continue
-
-    n = len(rows)
+    rng = np.random.default_rng(seed)
+    # Read in batches straight into preallocated columns (trimmed at the end) so the whole
+    # CSV is never held as a table alongside the feature matrix
+    capacity = _count_lines(csv_path)
+    days = np.empty(capacity, dtype=np.float32)
+    available = np.empty(capacity, dtype=np.bool_)
+    n = None
+    if pa is not None:
+        try:
+            n = _read_columns_arrow(csv_path, days, available)
+        except pa.ArrowInvalid:
+            n = None  # malformed counts: pandas coerces them and skips those rows
+    if n is None:
+        n = _read_columns_pandas(csv_path, days, available)
+
     if n == 0:
         raise ValueError(f"No valid rows in {csv_path}")
 
-    # Build full 4-feature matrix: real days_since, real is_available, synthetic distance & health_flag_count
-    X = np.zeros((n, 4))
-    for i, (days_since, is_av) in enumerate(rows):
-        X[i, 0] = days_since
-        X[i, 1] = np.random.uniform(0, 100)   # distance_km – not in CSV
-        X[i, 2] = is_av
-        X[i, 3] = np.random.randint(0, 6)     # health_flag_count – not in CSV
-
-    y = np.array([
-        rule_based_score(int(X[i, 0]), float(X[i, 1]), bool(X[i, 2]), int(X[i, 3]))
-        for i in range(n)
-    ])
+    # Full 4-feature matrix: real days_since, real is_available, synthetic distance & health_flag_count.
+    # float32 so the tree builder doesn't copy X; Fortran order so each feature column is
+    # contiguous for the column fills and the label pass
+    X = np.empty((n, 4), dtype=np.float32, order="F")
+    X[:, 0] = days[:n]
+    X[:, 1] = rng.uniform(0, 100, n)   # distance_km – not in CSV
+    X[:, 2] = available[:n]
+    X[:, 3] = rng.integers(0, 6, n)    # health_flag_count – not in CSV
+
+    y = compute_labels(X)
     return X, y
 
 
 def main():
-    # CSV: project root (akil/) or same dir as this script
-    base = os.path.dirname(os.path.abspath(__file__))
-    project_root = os.path.abspath(os.path.join(base, "..", ".."))
-    for candidate in [
-        os.path.join(project_root, "blood_donor_dataset.csv"),
-        os.path.join(base, "blood_donor_dataset.csv"),
-    ]:
-        if os.path.isfile(candidate):
-            csv_path = candidate
-            break
-    else:
+    csv_path = _find_csv()
+    if csv_path is None:
         raise FileNotFoundError(
             "blood_donor_dataset.csv not found. Place it in project root (akil/) or in backend/ml-service/."
         )
@@ -103,25 +154,40 @@ def main():
     X, y = load_csv_data(csv_path)
     print(f"Loaded {len(X)} samples. Target range: [{y.min():.0f}, {y.max():.0f}]")
 
-    X_train, X_val, y_train, y_val = train_test_split(X, y, test_size=0.15, random_state=42)
-    scaler = StandardScaler()
-    X_train_s = scaler.fit_transform(X_train)
-    X_val_s = scaler.transform(X_val)
-
-    model = RandomForestRegressor(n_estimators=100, max_depth=8, random_state=42)
-    model.fit(X_train_s, y_train)
-
-    pred = model.predict(X_val_s)
-    pred = np.clip(pred, 0, 100)
-    mae = np.abs(pred - y_val).mean()
-    print(f"Validation MAE (score 0-100): {mae:.2f}")
-
-    out_dir = os.path.join(base, "artifacts")
-    os.makedirs(out_dir, exist_ok=True)
-    joblib.dump(model, os.path.join(out_dir, "eligibility_model.joblib"))
-    joblib.dump(scaler, os.path.join(out_dir, "eligibility_scaler.joblib"))
-    joblib.dump(FEATURE_NAMES, os.path.join(out_dir, "feature_names.joblib"))
-    print("Model and scaler saved to", out_dir)
+    out_dir = str(_BASE_DIR / "artifacts")
+    # HEMOLINK_WARM_START=1: add trees for the new rows to the saved forest instead of refitting
+    base_model = load_warm_start_model(out_dir) if os.environ.get("HEMOLINK_WARM_START") == "1" else None
+    if base_model is not None:
+        # The saved trees were fit on these same rows, so neither a hold-out split nor OOB
+        # would be an unseen-data estimate: the new trees take every row and no MAE is shown
+        print(f"Warm start: adding {WARM_START_TREES} trees to the saved {base_model.n_estimators} (no MAE)")
+        model = fit_model(X, y, base_model)
+    else:
+        if not use_hgb():
+            # Every row trains the forest; its out-of-bag predictions stand in for a held-out split.
+            # With 20 trees ~0.01% of rows are in every bootstrap and get a 0 OOB prediction,
+            # which nudges the MAE up by a few thousandths; sklearn's warning about it is noise here.
+            with warnings.catch_warnings():
+                warnings.filterwarnings("ignore", message="Some inputs do not have OOB scores")
+                model = fit_model(X, y, oob_score=True)
+            pred, y_val = model.oob_prediction_, y
+            del model.oob_prediction_  # one float per row; not needed in the saved bundle
+            mae_label = "Out-of-bag MAE"
+        else:
+            # HGB has no OOB estimate: hold out 15%
+            X_train, X_val, y_train, y_val = train_test_split(X, y, test_size=0.15, random_state=42)
+            model = fit_model(X_train, y_train)
+            pred = model.predict(X_val)
+            mae_label = "Validation MAE"
+
+        # Clip and take the error in place: pred is the only validation-sized buffer
+        np.clip(pred, 0, 100, out=pred)
+        np.subtract(pred, y_val, out=pred)
+        mae = np.abs(pred, out=pred).mean()
+        print(f"{mae_label} (score 0-100): {mae:.2f}")
+
+    save_bundle(model, out_dir)
+    print("Model bundle saved to", out_dir)
 
 
 if __name__ == "__main__":
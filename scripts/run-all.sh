@@ -32,7 +32,7 @@ if [ ! -d "$ML_DIR/.venv" ]; then
 fi
 echo "[setup] pip install (ml-service)"
 (cd "$ML_DIR" && ./.venv/bin/pip install -q -r requirements.txt)
-if [ ! -f "$ML_DIR/artifacts/eligibility_model.joblib" ]; then
+if [ ! -f "$ML_DIR/artifacts/eligibility_bundle.joblib" ]; then
   echo "[setup] Training ML model (first time)"
   (cd "$ML_DIR" && ./.venv/bin/python train_model.py)
 else